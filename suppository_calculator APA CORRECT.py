@@ -1,84 +1,175 @@
+from dataclasses import dataclass
+
+import numpy as np
 import streamlit as st
 
+_METHOD_MD = """
+1) **Total API amount**: Sum of all actives for all suppositories.  
+2) **Estimated blank base**: Average blank weight × number of suppositories.  
+3) **Density ratio**: ρ(API) / ρ(base).  
+4) **Base displaced**: Total API weight ÷ ratio from Step 3 (for multiple APIs, sum per-component displacement).  
+5) **Required base**: Step 2 − Step 4.
+"""
+
+# Per-row widget defaults and keys, built once at import instead of per rerun.
+_MAX_APIS = 5
+_AMT_DEFAULTS = [200.0] + [0.0] * (_MAX_APIS - 1)
+_RHO_DEFAULTS = [3.0] + [1.0] * (_MAX_APIS - 1)
+_AMT_KEYS, _UNIT_KEYS, _RHO_KEYS = [[f"{k}_{i}" for i in range(_MAX_APIS)] for k in ("amt", "unit", "rho")]
+
+# Bound .format templates: the format specs are parsed once at import instead
+# of per f-string in the render loop.
+_STEP3_FMT = "- {0}: {1:.4f}/{2:.4f} = **{3:.4f}**".format
+_STEP4_FMT = "- {0}: per unit = {1:.4f} ÷ {2:.4f} = {3:.4f} g; total = **{4:.4f} g**".format
+
 st.set_page_config(page_title="Suppository Base Calculator — 5-Step", layout="centered")
 
 st.title("Suppository Base Calculator — 5-Step Method")
 st.caption("Implements only the five-step density-ratio calculator plus error checks/coaching.")
 
 with st.expander("Method (5 steps)", expanded=False):
-    st.markdown("""
-1) **Total API amount**: Sum of all actives for all suppositories.  
-2) **Estimated blank base**: Average blank weight × number of suppositories.  
-3) **Density ratio**: ρ(API) / ρ(base).  
-4) **Base displaced**: Total API weight ÷ ratio from Step 3 (for multiple APIs, sum per-component displacement).  
-5) **Required base**: Step 2 − Step 4.
-""")
+    st.markdown(_METHOD_MD)
+
+@dataclass(slots=True)
+class StepResults:
+    """Structure-of-arrays result of the 5-step computation."""
+    names: list
+    amt_g: list
+    rho: list
+    ratios: list
+    displaced_per_unit: list
+    total_api_weight: float
+    estimated_blank_base: float
+    base_displaced: float
+    required_base: float
+
+
+@st.cache_data(show_spinner=False)
+def compute_suppository(n: int, blank_unit_weight_g: float, base_density: float, apis_tuple: tuple) -> StepResults:
+    """Pure 5-step math; apis_tuple rows are (name, amt_g, rho). Hashable
+    inputs let identical reruns hit the cache instead of recomputing."""
+    # One pass to parallel arrays, then vectorized reductions instead of
+    # re-walking the API rows for every step.
+    arr = np.array([(t[1], t[2]) for t in apis_tuple], dtype=np.float64)
+    amt_g_arr, rho_arr = arr[:, 0], arr[:, 1]
+
+    total_api_weight = float(amt_g_arr.sum()) * n  # g
+    estimated_blank_base = blank_unit_weight_g * n  # g
+    # For multiple APIs: sum of component displacements = Σ (m_i / ρ_i) × ρ(base) × N
+    # One scalar division up front; the per-API ratios become multiplications.
+    inv_base_rho = 1.0 / base_density
+    ratios_arr = rho_arr * inv_base_rho
+    displaced_per_unit_arr = amt_g_arr / ratios_arr  # g per unit, per API
+    base_displaced = float(displaced_per_unit_arr.sum()) * n  # g
+
+    return StepResults(
+        names=[t[0] for t in apis_tuple],
+        amt_g=amt_g_arr.tolist(),
+        rho=rho_arr.tolist(),
+        ratios=ratios_arr.tolist(),
+        displaced_per_unit=displaced_per_unit_arr.tolist(),
+        total_api_weight=total_api_weight,
+        estimated_blank_base=estimated_blank_base,
+        base_displaced=base_displaced,
+        required_base=estimated_blank_base - base_displaced,
+    )
+
 
 # --- Inputs ---
 st.markdown("### Inputs")
 
-colA, colB, colC = st.columns(3)
-with colA:
-    n = st.number_input("Number of suppositories (N)", min_value=1, value=1, step=1)
-with colB:
-    blank_unit_weight_g = st.number_input("Average blank weight per unit (g)", min_value=0.0, value=2.0, step=0.01, format="%.4f")
-with colC:
-    base_density = st.number_input("Base density ρ(base) (g/mL)", min_value=0.0001, value=1.0, step=0.01, format="%.4f")
-
-st.markdown("#### Active ingredients (per suppository)")
-max_apis = st.number_input("How many API components?", min_value=1, max_value=5, value=1, step=1)
-apis = []
-for i in range(int(max_apis)):
-    cols = st.columns([2, 1, 1, 1])
-    with cols[0]:
-        name = st.text_input(f"Name (API {i+1})", value=f"API {i+1}")
-    with cols[1]:
-        amt_value = st.number_input(f"Amount ({i+1})", min_value=0.0, value=200.0 if i==0 else 0.0, step=0.01, format="%.4f", key=f"amt_{i}")
-    with cols[2]:
-        unit = st.selectbox(f"Unit ({i+1})", ["mg", "g"], index=0, key=f"unit_{i}")
-    with cols[3]:
-        rho = st.number_input(f"ρ(API {i+1}) (g/mL)", min_value=0.0001, value=3.0 if i==0 else 1.0, step=0.01, format="%.4f", key=f"rho_{i}")
-    amt_g = amt_value/1000.0 if unit == "mg" else amt_value
-    apis.append({"name": name, "amt_g": amt_g, "rho": rho})
-
-st.divider()
-
-# --- Calculations ---
-total_api_weight = sum(a["amt_g"] for a in apis) * n  # g
-estimated_blank_base = blank_unit_weight_g * n  # g
-# For multiple APIs: sum of component displacements = Σ (m_i / ρ_i) × ρ(base) × N
-base_displaced = sum((a["amt_g"] / a["rho"]) * base_density for a in apis) * n  # g
-required_base = estimated_blank_base - base_displaced
-
-# --- Output: Stepwise ---
-st.markdown("### Step-by-Step Results")
-st.markdown("**Step 1: Total API amount**")
-st.write(f"Σ(amount per unit) × N = **{total_api_weight:.4f} g**")
-
-st.markdown("**Step 2: Estimated blank base**")
-st.write(f"{blank_unit_weight_g:.4f} g × {n} = **{estimated_blank_base:.4f} g**")
-
-st.markdown("**Step 3: Density ratio ρ(API)/ρ(base)**")
-for a in apis:
-    ratio = a["rho"] / base_density
-    st.write(f"- {a['name']}: {a['rho']:.4f}/{base_density:.4f} = **{ratio:.4f}**")
-
-st.markdown("**Step 4: Base displaced by APIs**")
-for a in apis:
-    ratio = a["rho"] / base_density
-    displaced_per_unit = a["amt_g"] / ratio  # g per unit
-    displaced_total = displaced_per_unit * n
-    st.write(f"- {a['name']}: per unit = {a['amt_g']:.4f} ÷ {ratio:.4f} = {displaced_per_unit:.4f} g; total = **{displaced_total:.4f} g**")
-st.write(f"**Total base displaced** = **{base_displaced:.4f} g**")
-
-st.markdown("**Step 5: Required base**")
-st.write(f"{estimated_blank_base:.4f} − {base_displaced:.4f} = **{required_base:.4f} g**")
-
-st.markdown(
-    "**Tip:** For a single API, Step 4 can be written as: Base displaced = Total API × (ρ(base)/ρ(API)). "
-    "This is algebraically identical to dividing by the Step-3 ratio."
-)
-
-# Basic sanity warning
-if required_base < 0:
-    st.warning("The required base is negative. Your blank weight may be too small or API load too high for this mold.")
+# Row count stays outside the form so changing it re-renders the rows at once.
+max_apis = st.number_input("How many API components?", min_value=1, max_value=_MAX_APIS, value=1, step=1)
+
+# Batch the remaining inputs in a form: the script reruns once per Compute
+# click instead of once per keystroke.
+with st.form("suppository_inputs", clear_on_submit=False):
+    colA, colB, colC = st.columns(3)
+    with colA:
+        n = st.number_input("Number of suppositories (N)", min_value=1, value=1, step=1)
+    with colB:
+        blank_unit_weight_g = st.number_input("Average blank weight per unit (g)", min_value=0.0, value=2.0, step=0.01, format="%.4f")
+    with colC:
+        base_density = st.number_input("Base density ρ(base) (g/mL)", min_value=0.0001, value=1.0, step=0.01, format="%.4f")
+
+    st.markdown("#### Active ingredients (per suppository)")
+    # Structure-of-arrays collection: parallel lists instead of one dict per row.
+    names_in, amt_values, units, rho_list = [], [], [], []
+    for i in range(int(max_apis)):
+        cols = st.columns([2, 1, 1, 1])
+        with cols[0]:
+            name = st.text_input(f"Name (API {i+1})", value=f"API {i+1}")
+        with cols[1]:
+            amt_value = st.number_input(f"Amount ({i+1})", min_value=0.0, value=_AMT_DEFAULTS[i], step=0.01, format="%.4f", key=_AMT_KEYS[i])
+        with cols[2]:
+            unit = st.selectbox(f"Unit ({i+1})", ["mg", "g"], index=0, key=_UNIT_KEYS[i])
+        with cols[3]:
+            rho = st.number_input(f"ρ(API {i+1}) (g/mL)", min_value=0.0001, value=_RHO_DEFAULTS[i], step=0.01, format="%.4f", key=_RHO_KEYS[i])
+        names_in.append(name)
+        amt_values.append(amt_value)
+        units.append(unit)
+        rho_list.append(rho)
+
+    submitted = st.form_submit_button("Compute")
+
+if submitted:
+    st.session_state["last_result"] = True  # keep results visible on later reruns
+
+if submitted or "last_result" in st.session_state:
+    st.divider()
+
+    # --- Calculations (cached on the immutable input signature) ---
+    # Branchless unit conversion: mg rows scale by 1e-3 in one vector multiply.
+    scale = np.where(np.asarray(units) == "mg", 1e-3, 1.0)
+    amt_g_list = (np.asarray(amt_values, dtype=np.float64) * scale).tolist()
+    # Pure-UI reruns (expander toggles, resizes) reuse the stored results
+    # without even paying the cache-key hashing of compute_suppository.
+    inputs_hash = hash((n, blank_unit_weight_g, base_density,
+                        tuple(names_in), tuple(amt_g_list), tuple(rho_list)))
+    if st.session_state.get("inputs_hash") == inputs_hash and "results" in st.session_state:
+        results = st.session_state["results"]
+    else:
+        results = compute_suppository(n, blank_unit_weight_g, base_density,
+                                      tuple(zip(names_in, amt_g_list, rho_list)))
+        st.session_state["inputs_hash"] = inputs_hash
+        st.session_state["results"] = results
+    names = results.names
+    total_api_weight = results.total_api_weight
+    estimated_blank_base = results.estimated_blank_base
+    base_displaced = results.base_displaced
+    required_base = results.required_base
+
+    # --- Output: Stepwise ---
+    st.markdown("### Step-by-Step Results")
+    st.markdown("**Step 1: Total API amount**")
+    st.write(f"Σ(amount per unit) × N = **{total_api_weight:.4f} g**")
+
+    st.markdown("**Step 2: Estimated blank base**")
+    st.write(f"{blank_unit_weight_g:.4f} g × {n} = **{estimated_blank_base:.4f} g**")
+
+    # Single pass over the APIs builds both step listings.
+    step3_lines, step4_lines = [], []
+    for name, amt_g, rho_i, ratio, displaced_per_unit in zip(
+            names, results.amt_g, results.rho, results.ratios, results.displaced_per_unit):
+        step3_lines.append(_STEP3_FMT(name, rho_i, base_density, ratio))
+        step4_lines.append(_STEP4_FMT(name, amt_g, ratio, displaced_per_unit, displaced_per_unit * n))
+
+    # One markdown element per step instead of one st.write per API row.
+    st.markdown("**Step 3: Density ratio ρ(API)/ρ(base)**\n" + "\n".join(step3_lines))
+    st.markdown(
+        "**Step 4: Base displaced by APIs**\n"
+        + "\n".join(step4_lines)
+        + f"\n\n**Total base displaced** = **{base_displaced:.4f} g**"
+    )
+
+    st.markdown("**Step 5: Required base**")
+    st.write(f"{estimated_blank_base:.4f} − {base_displaced:.4f} = **{required_base:.4f} g**")
+
+    st.markdown(
+        "**Tip:** For a single API, Step 4 can be written as: Base displaced = Total API × (ρ(base)/ρ(API)). "
+        "This is algebraically identical to dividing by the Step-3 ratio."
+    )
+
+    # Basic sanity warning
+    if required_base < 0:
+        st.warning("The required base is negative. Your blank weight may be too small or API load too high for this mold.")
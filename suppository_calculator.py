@@ -1,25 +1,56 @@
 # suppository_calculator.py
 # Suppository Base Calculator — 5-Step (enhanced pharmacist-friendly version)
 
-import math
+import csv
+import io
 from pathlib import Path
-from PIL import Image
+import numpy as np
+import pandas as pd
 import streamlit as st
 
 APP_DIR = Path(__file__).parent
 LOGO_PATH = APP_DIR / "logo.png"
 
-st.image(Image.open(LOGO_PATH), width=800)
-st.markdown("<h3>🗨️ Chat with an AI tutor to compute the required base using the 5-step density-ratio method.⚕️</div>", unsafe_allow_html=True)
+# Quick-pick bases: label -> density prefill (None = custom entry).
+# Built once at import instead of on every rerun.
+_BASE_OPTIONS = {
+    "Cocoa butter (theobroma oil) ~0.90 g/mL": 0.90,
+    "PEG blend (e.g., 1450/1000) ~1.20 g/mL": 1.20,
+    "Glycerinated gelatin ~1.25 g/mL": 1.25,
+    "Witepsol/HBW type ~0.95 g/mL": 0.95,
+    "Custom…": None,
+}
+_BASE_LABELS = list(_BASE_OPTIONS)
 
-with st.expander("Method (5 steps)", expanded=False):
-    st.markdown("""
+# Rounding choices: label -> step size (0.0 = no rounding).
+_ROUND_STEPS = {"none": 0.0, "0.001 g": 0.001, "0.01 g": 0.01, "0.1 g": 0.1}
+
+_METHOD_MD = """
 1) **Total API amount**: Sum of all actives for all suppositories.  
 2) **Estimated blank base**: Average blank weight × number of suppositories.  
 3) **Density ratio**: ρ(API) / ρ(base).  
 4) **Base displaced**: For a single API, `Total API ÷ (ρ(API)/ρ(base))`. For multiple APIs, sum component displacements: `Σ[(m_i/ρ_i)×ρ_base]`.  
 5) **Required base**: Step 2 − Step 4.
-""")
+"""
+
+
+@st.cache_resource
+def _load_logo(path: str, max_px: int):
+    # Downscale once at load so the cached image matches the display size
+    # instead of shipping the full-resolution bitmap on every rerun.
+    # Pillow is only needed here, so defer its import off the cold-start path.
+    from PIL import Image
+
+    img = Image.open(path)
+    img.thumbnail((max_px, max_px), Image.LANCZOS)
+    return img
+
+
+st.image(_load_logo(str(LOGO_PATH), 800), width=800)
+st.markdown("<h3>🗨️ Chat with an AI tutor to compute the required base using the 5-step density-ratio method.⚕️</div>", unsafe_allow_html=True)
+
+with st.expander("Method (5 steps)", expanded=False):
+    st.markdown(_METHOD_MD)
 
 # -------------------------
 # Sidebar Inputs (dynamic)
@@ -29,15 +60,8 @@ N = st.sidebar.number_input("Number of suppositories (N)", min_value=1, value=12
 
 # Quick-pick bases
 st.sidebar.subheader("Base")
-base_options = {
-    "Cocoa butter (theobroma oil) ~0.90 g/mL": 0.90,
-    "PEG blend (e.g., 1450/1000) ~1.20 g/mL": 1.20,
-    "Glycerinated gelatin ~1.25 g/mL": 1.25,
-    "Witepsol/HBW type ~0.95 g/mL": 0.95,
-    "Custom…": None,
-}
-base_choice = st.sidebar.selectbox("Select base (prefill density)", list(base_options.keys()), index=0)
-base_density = base_options[base_choice] if base_options[base_choice] else st.sidebar.number_input(
+base_choice = st.sidebar.selectbox("Select base (prefill density)", _BASE_LABELS, index=0)
+base_density = _BASE_OPTIONS[base_choice] if _BASE_OPTIONS[base_choice] else st.sidebar.number_input(
     "ρ(base) (g/mL)", min_value=0.0001, value=1.0, step=0.01, format="%.4f"
 )
 blank_unit_weight_g = st.sidebar.number_input("Average blank weight per unit (g)", min_value=0.0, value=2.00, step=0.01, format="%.4f")
@@ -53,26 +77,37 @@ api_mode = st.sidebar.radio(
 st.sidebar.subheader("Active Ingredients (per suppository)")
 max_apis = st.sidebar.number_input("How many API components?", min_value=1, max_value=6, value=1, step=1)
 
-# Dynamic API inputs (update instantly)
+# Dynamic API inputs: one editable table instead of 3 widgets per API.
+n_rows = int(max_apis)
+if api_mode == "Density (ρ)":
+    prop_col = "ρ (g/mL)"
+    prop_defaults = [3.00] + [1.00] * (n_rows - 1)
+else:
+    prop_col = "DF (g API per 1 g base)"
+    prop_defaults = [1.50] + [1.00] * (n_rows - 1)
+
+api_table = st.sidebar.data_editor(
+    pd.DataFrame({
+        "Amount": [200.0] + [0.0] * (n_rows - 1),
+        "Unit": ["mg"] * n_rows,
+        prop_col: prop_defaults,
+    }),
+    num_rows="fixed",
+    column_config={
+        "Amount": st.column_config.NumberColumn(min_value=0.0, format="%.4f", required=True),
+        "Unit": st.column_config.SelectboxColumn(options=["mg", "g"], required=True),
+        prop_col: st.column_config.NumberColumn(min_value=0.0001, format="%.4f", required=True),
+    },
+    key=f"apis_table_{api_mode}_{n_rows}",
+)
+
 apis = []
-for i in range(int(max_apis)):
-    st.sidebar.markdown(f"**API {i+1}**")
-    cols = st.sidebar.columns([1, 1, 1])
-    with cols[0]:
-        amt_value = st.number_input(f"Amount ({i+1})", min_value=0.0, value=200.0 if i == 0 else 0.0,
-                                    step=0.01, format="%.4f", key=f"amt_{i}")
-    with cols[1]:
-        unit = st.selectbox(f"Unit ({i+1})", ["mg", "g"], index=0, key=f"unit_{i}")
-    with cols[2]:
-        if api_mode == "Density (ρ)":
-            rho = st.number_input(f"ρ (g/mL)", min_value=0.0001, value=3.00 if i == 0 else 1.00,
-                                  step=0.01, format="%.4f", key=f"rho_{i}")
-            df = None
-        else:
-            df = st.number_input(f"DF (g API per 1 g base)", min_value=0.0001, value=1.50 if i == 0 else 1.00,
-                                 step=0.01, format="%.4f", key=f"df_{i}")
-            rho = None
-    amt_g = amt_value / 1000.0 if unit == "mg" else amt_value
+for i, row in enumerate(api_table.to_dict("records")):
+    amt_g = row["Amount"] / 1000.0 if row["Unit"] == "mg" else row["Amount"]
+    if api_mode == "Density (ρ)":
+        rho, df = row[prop_col], None
+    else:
+        rho, df = None, row[prop_col]
     apis.append({"name": f"API {i+1}", "amt_g": amt_g, "rho": rho, "df": df})
 
 # Pharmacy controls and submit button in a form
@@ -80,84 +115,154 @@ with st.sidebar.form("calc_form"):
     st.markdown("---")
     st.subheader("Pharmacy Controls")
     overage_pct = st.number_input("Overage for base to cover loss (%)", min_value=0.0, value=0.0, step=0.5)
-    round_step = st.selectbox("Round required base to nearest", ["none", "0.001 g", "0.01 g", "0.1 g"], index=1)
+    round_step = st.selectbox("Round required base to nearest", list(_ROUND_STEPS), index=1)
 
     submitted = st.form_submit_button("Calculate")
 
 # -------------------------
-# Helper functions
+# Calculations (pure math, cached on inputs)
 # -------------------------
-def round_to(x, step_label):
-    if step_label == "none":
-        return x
-    step = {"0.001 g": 0.001, "0.01 g": 0.01, "0.1 g": 0.1}[step_label]
-    if step <= 0:
-        return x
-    return round(x / step) * step
-
-# -------------------------
-# Calculations after submit
-# -------------------------
-if submitted:
-    # Step 1: total API (batch)
-    total_api_per_unit = sum(a["amt_g"] for a in apis)          # g per unit
+@st.cache_data(max_entries=64)
+def compute_batch(N: int, blank_unit_weight_g: float, base_density: float,
+                  api_mode: str, api_tuple: tuple, overage_pct: float, round_step: str) -> dict:
+    """5-step batch math. api_tuple rows are (name, amt_g, rho, df); inputs
+    are hashable so identical reruns hit the cache instead of recomputing."""
+    # Step 1: total API (batch) — vectorized over the API table
+    amt_arr = np.fromiter((t[1] for t in api_tuple), dtype=np.float64, count=len(api_tuple))
+    total_api_per_unit = float(amt_arr.sum())                    # g per unit
     total_api_batch = total_api_per_unit * N                     # g batch
 
     # Step 2: estimated blank base (batch)
     est_blank_batch = blank_unit_weight_g * N                    # g batch
 
     # Step 3 & 4: displacement (supports Density or DF)
-    displaced_per_unit = 0.0
     ratios = []  # for density mode reporting
+    wrong_displaced_per_unit = None
 
     if api_mode == "Density (ρ)":
-        for a in apis:
-            if not a["rho"] or a["rho"] <= 0:
-                st.error(f"{a['name']}: API density must be > 0.")
-                st.stop()
-            ratio = a["rho"] / base_density
-            ratios.append((a["name"], ratio, a["rho"]))
-            displaced_per_unit += (a["amt_g"] / ratio)  # g base per unit
+        rho_arr = np.fromiter((t[2] for t in api_tuple), dtype=np.float64, count=len(api_tuple))
+        ratios_arr = rho_arr / base_density
+        ratios = list(zip((t[0] for t in api_tuple), ratios_arr.tolist(), rho_arr.tolist()))
+        # amt/ratio == amt * (1/rho) * rho_base: one inverse pass turns the
+        # per-API divisions into multiplications.
+        inv_rho = 1.0 / rho_arr
+        displaced_per_unit = float((amt_arr * inv_rho).sum()) * base_density  # g base per unit
+        # Derive the "reversed Step 3" figure from the same arrays, so the
+        # coaching section below is pure formatting.
+        wrong_displaced_per_unit = float((amt_arr * rho_arr).sum()) / base_density
     else:
-        for a in apis:
-            if not a["df"] or a["df"] <= 0:
-                st.error(f"{a['name']}: DF must be > 0.")
-                st.stop()
-            displaced_per_unit += (a["amt_g"] / a["df"])  # g base per unit
+        df_arr = np.fromiter((t[3] for t in api_tuple), dtype=np.float64, count=len(api_tuple))
+        displaced_per_unit = float((amt_arr / df_arr).sum())  # g base per unit
 
     displaced_batch = displaced_per_unit * N
     required_base_per_unit = blank_unit_weight_g - displaced_per_unit
     required_base_batch = est_blank_batch - displaced_batch
 
-    if overage_pct > 0:
-        required_base_batch *= (1 + overage_pct / 100.0)
-
-    required_base_batch = round_to(required_base_batch, round_step)
-    required_base_per_unit_out = required_base_batch / N
+    # Overage and rounding, fused into one pass over the batch figure.
+    required_base_batch *= (1 + overage_pct / 100.0)
+    step = _ROUND_STEPS[round_step]
+    if step > 0:
+        required_base_batch = round(required_base_batch / step) * step
+
+    return {
+        "total_api_per_unit": total_api_per_unit,
+        "total_api_batch": total_api_batch,
+        "est_blank_batch": est_blank_batch,
+        "ratios": ratios,
+        "displaced_per_unit": displaced_per_unit,
+        "displaced_batch": displaced_batch,
+        "required_base_per_unit": required_base_per_unit,
+        "required_base_batch": required_base_batch,
+        "required_base_per_unit_out": required_base_batch / N,
+        "wrong_displaced_per_unit": wrong_displaced_per_unit,
+    }
 
-    # Results
-    st.markdown("### Step-by-Step Results")
-    st.markdown("**Step 1: Total API amount**")
-    st.write(f"Per unit = **{total_api_per_unit:.4f} g**; Batch (×{N}) = **{total_api_batch:.4f} g**")
-
-    st.markdown("**Step 2: Estimated blank base**")
-    st.write(f"Per unit = **{blank_unit_weight_g:.4f} g**; Batch (×{N}) = **{est_blank_batch:.4f} g**")
 
+# -------------------------
+# Calculations after submit
+# -------------------------
+if submitted:
+    # Validate before entering the cached math (Streamlit calls stay out of it):
+    # one vectorized check, one consolidated message naming every offending API.
     if api_mode == "Density (ρ)":
-        st.markdown("**Step 3: Density ratio ρ(API)/ρ(base)**")
-        st.write(f"ρ(base) = **{base_density:.4f} g/mL**")
-        for name, ratio, rho_api in ratios:
-            st.write(f"- {name}: {rho_api:.4f}/{base_density:.4f} = **{ratio:.4f}**")
+        vals = np.fromiter((a["rho"] or 0.0 for a in apis), dtype=np.float64, count=len(apis))
+        label = "API density"
+    else:
+        vals = np.fromiter((a["df"] or 0.0 for a in apis), dtype=np.float64, count=len(apis))
+        label = "DF"
+    bad_idx = np.where(~(vals > 0))[0]  # also catches NaN from a cleared cell
+    if bad_idx.size:
+        st.error(f"{label} must be > 0 for: " + ", ".join(apis[i]["name"] for i in bad_idx))
+        st.stop()
+
+    api_tuple = tuple((a["name"], a["amt_g"], a["rho"], a["df"]) for a in apis)
+    # Session-level short circuit: identical inputs reuse the stored results
+    # without paying even the cache-key hashing of compute_batch.
+    inputs_hash = hash((N, blank_unit_weight_g, base_density, api_mode, api_tuple, overage_pct, round_step))
+    if st.session_state.get("last_hash") == inputs_hash and "last_results" in st.session_state:
+        res = st.session_state.last_results
+    else:
+        res = compute_batch(N, blank_unit_weight_g, base_density, api_mode, api_tuple, overage_pct, round_step)
+        st.session_state.last_hash = inputs_hash
+        st.session_state.last_results = res
+    total_api_per_unit = res["total_api_per_unit"]
+    total_api_batch = res["total_api_batch"]
+    est_blank_batch = res["est_blank_batch"]
+    ratios = res["ratios"]
+    displaced_per_unit = res["displaced_per_unit"]
+    displaced_batch = res["displaced_batch"]
+    required_base_per_unit = res["required_base_per_unit"]
+    required_base_batch = res["required_base_batch"]
+    required_base_per_unit_out = res["required_base_per_unit_out"]
+    wrong_displaced_per_unit = res["wrong_displaced_per_unit"]
+
+    # Results — one markdown element per block instead of one per line.
+    st.markdown(
+        "### Step-by-Step Results\n\n"
+        "**Step 1: Total API amount**\n\n"
+        f"Per unit = **{total_api_per_unit:.4f} g**; Batch (×{N}) = **{total_api_batch:.4f} g**\n\n"
+        "**Step 2: Estimated blank base**\n\n"
+        f"Per unit = **{blank_unit_weight_g:.4f} g**; Batch (×{N}) = **{est_blank_batch:.4f} g**"
+    )
+
+    # One table per step instead of one st.write element per API row.
+    if api_mode == "Density (ρ)":
+        st.markdown(
+            "**Step 3: Density ratio ρ(API)/ρ(base)**\n\n"
+            f"ρ(base) = **{base_density:.4f} g/mL**"
+        )
+        results_df = pd.DataFrame({
+            "API": [name for name, _, _ in ratios],
+            "amt (g)": [a["amt_g"] for a in apis],
+            "ρ (g/mL)": [rho_api for _, _, rho_api in ratios],
+            "ratio": [ratio for _, ratio, _ in ratios],
+            "displaced/unit (g)": [a["amt_g"] / ratio for a, (_, ratio, _) in zip(apis, ratios)],
+        })
+        # One bulk Styler format call instead of f-string formatting per cell.
+        st.table(results_df.style.format({
+            "amt (g)": "{:.4f}",
+            "ρ (g/mL)": "{:.4f}",
+            "ratio": "{:.4f}",
+            "displaced/unit (g)": "{:.4f}",
+        }))
     else:
         st.markdown("**Step 3: Displacement Factor (DF) mode**")
-        for a in apis:
-            st.write(f"- {a['name']}: DF = **{a['df']:.4f}** (g API per 1 g base)")
-
-    st.markdown("**Step 4: Base displaced by APIs**")
-    st.write(f"Per unit displaced base = **{displaced_per_unit:.4f} g**; Batch displaced base = **{displaced_batch:.4f} g**")
-
-    st.markdown("**Step 5: Required base**")
-    st.write(f"Per unit required base = **{required_base_per_unit_out:.4f} g**; Batch required base = **{required_base_batch:.4f} g**")
+        df_table = pd.DataFrame({
+            "API": [a["name"] for a in apis],
+            "amt (g)": [a["amt_g"] for a in apis],
+            "DF (g API per 1 g base)": [a["df"] for a in apis],
+        })
+        st.table(df_table.style.format({
+            "amt (g)": "{:.4f}",
+            "DF (g API per 1 g base)": "{:.4f}",
+        }))
+
+    st.markdown(
+        "**Step 4: Base displaced by APIs**\n\n"
+        f"Per unit displaced base = **{displaced_per_unit:.4f} g**; Batch displaced base = **{displaced_batch:.4f} g**\n\n"
+        "**Step 5: Required base**\n\n"
+        f"Per unit required base = **{required_base_per_unit_out:.4f} g**; Batch required base = **{required_base_batch:.4f} g**"
+    )
 
     st.divider()
 
@@ -182,61 +287,52 @@ if submitted:
     st.markdown("### ✔️Error Checks & Coaching")
 
     if api_mode == "Density (ρ)":
-        # WRONG #1: multiply instead of divide (reversing Step 3 logic)
-        wrong_displaced_per_unit = 0.0
-        for a in apis:
-            ratio = a["rho"] / base_density
-            wrong_displaced_per_unit += a["amt_g"] * ratio  # WRONG
+        # WRONG #1: multiply instead of divide (reversing Step 3 logic).
+        # wrong_displaced_per_unit was derived alongside the real figures above.
         wrong_displaced_batch = wrong_displaced_per_unit * N
         wrong_required_batch = est_blank_batch - wrong_displaced_batch
         diff = abs(wrong_required_batch - (est_blank_batch - displaced_batch))
 
-        st.markdown(
-            f"**Common mistake detected (reversing Step 3):** If you used ρ(base)/ρ(API) and then multiplied by the ratio in Step 4, "
-            f"you'd compute base displaced = **{wrong_displaced_batch:.4f} g**, leading to required base = **{wrong_required_batch:.4f} g** "
-            f"(off by **{diff:.4f} g**). Remember: Step 3 ratio is ρ(API)/ρ(base), and Step 4 is **divide** total API weight by that ratio."
-        )
-
         # WRONG #2: subtract API mass directly from blank base
         direct_subtract_required_batch = est_blank_batch - total_api_batch
-        st.markdown(
-            f"**Another mistake:** Subtracting API weight directly from the blank base would give **{direct_subtract_required_batch:.4f} g**, "
-            "which ignores displacement by density. Use the density ratio to find the base displaced, not the API weight."
-        )
 
         st.markdown(
+            f"**Common mistake detected (reversing Step 3):** If you used ρ(base)/ρ(API) and then multiplied by the ratio in Step 4, "
+            f"you'd compute base displaced = **{wrong_displaced_batch:.4f} g**, leading to required base = **{wrong_required_batch:.4f} g** "
+            f"(off by **{diff:.4f} g**). Remember: Step 3 ratio is ρ(API)/ρ(base), and Step 4 is **divide** total API weight by that ratio.\n\n"
+            f"**Another mistake:** Subtracting API weight directly from the blank base would give **{direct_subtract_required_batch:.4f} g**, "
+            "which ignores displacement by density. Use the density ratio to find the base displaced, not the API weight.\n\n"
             "**Tip:** For a single API, Step 4 can be written as: Base displaced = Total API × (ρ(base)/ρ(API)). "
             "This is algebraically identical to dividing by the Step-3 ratio."
         )
     else:
         st.info("In **DF mode**, compute displaced base with: per-unit displaced base = Σ(m_i / DF_i). Avoid subtracting API mass directly from blank base.")
 
-    # Export
+    # Export — csv.writer into one StringIO buffer (also quotes labels/names
+    # containing commas correctly, which plain f-string joins did not).
     st.markdown("### 💻Export")
-    lines = [
-        "Suppository Base Calculator — 5-Step",
-        f"N,{N}",
-        f"Blank per unit (g),{blank_unit_weight_g:.4f}",
-        f"Base density (g/mL),{base_density:.4f}",
-        f"Mode,{api_mode}",
-    ]
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["Suppository Base Calculator — 5-Step"])
+    w.writerow(["N", N])
+    w.writerow(["Blank per unit (g)", f"{blank_unit_weight_g:.4f}"])
+    w.writerow(["Base density (g/mL)", f"{base_density:.4f}"])
+    w.writerow(["Mode", api_mode])
     for a in apis:
         if api_mode == "Density (ρ)":
-            lines.append(f"{a['name']} amount per unit (g),{a['amt_g']:.4f},rho,{a['rho']:.4f}")
+            w.writerow([f"{a['name']} amount per unit (g)", f"{a['amt_g']:.4f}", "rho", f"{a['rho']:.4f}"])
         else:
-            lines.append(f"{a['name']} amount per unit (g),{a['amt_g']:.4f},DF,{a['df']:.4f}")
-    lines += [
-        f"Total API per unit (g),{total_api_per_unit:.4f}",
-        f"Total API batch (g),{total_api_batch:.4f}",
-        f"Estimated blank batch (g),{est_blank_batch:.4f}",
-        f"Displaced base per unit (g),{displaced_per_unit:.4f}",
-        f"Displaced base batch (g),{displaced_batch:.4f}",
-        f"Required base batch (g) (after overage, rounded),{required_base_batch:.4f}",
-        f"Required base per unit (g) (from rounded batch),{required_base_per_unit_out:.4f}",
-        f"Overage (%),{overage_pct:.2f}",
-        f"Rounding step,{round_step}",
-    ]
-    csv_text = "\n".join(lines)
+            w.writerow([f"{a['name']} amount per unit (g)", f"{a['amt_g']:.4f}", "DF", f"{a['df']:.4f}"])
+    w.writerow(["Total API per unit (g)", f"{total_api_per_unit:.4f}"])
+    w.writerow(["Total API batch (g)", f"{total_api_batch:.4f}"])
+    w.writerow(["Estimated blank batch (g)", f"{est_blank_batch:.4f}"])
+    w.writerow(["Displaced base per unit (g)", f"{displaced_per_unit:.4f}"])
+    w.writerow(["Displaced base batch (g)", f"{displaced_batch:.4f}"])
+    w.writerow(["Required base batch (g) (after overage, rounded)", f"{required_base_batch:.4f}"])
+    w.writerow(["Required base per unit (g) (from rounded batch)", f"{required_base_per_unit_out:.4f}"])
+    w.writerow(["Overage (%)", f"{overage_pct:.2f}"])
+    w.writerow(["Rounding step", round_step])
+    csv_text = buf.getvalue()
     st.download_button("Download results (CSV)", data=csv_text, file_name="suppository_calculation.csv", mime="text/csv")
 else:
     st.info("Enter inputs in the sidebar and click **Calculate** to see results.")
@@ -1,23 +1,52 @@
 # suppository_calculator_updated.py
 # Suppository Base Calculator — Refactored version (no API name field)
 
-import math
 from pathlib import Path
-from PIL import Image
+import pandas as pd
 import streamlit as st
 
 APP_DIR = Path.cwd()
 LOGO_PATH = APP_DIR / "logo.png"
 
-st.markdown("""
+# Quick-pick bases: label -> density prefill (None = custom entry).
+# Built once at import instead of on every rerun.
+_BASE_OPTIONS = {
+    "Cocoa butter (theobroma oil) ~0.90 g/mL": 0.90,
+    "PEG blend (e.g., 1450/1000) ~1.20 g/mL": 1.20,
+    "Glycerinated gelatin ~1.25 g/mL": 1.25,
+    "Witepsol/HBW type ~0.95 g/mL": 0.95,
+    "Custom…": None,
+}
+_BASE_LABELS = list(_BASE_OPTIONS)
+
+# Rounding choices: label -> step size (None = no rounding).
+_ROUND_STEPS = {"none": None, "0.001 g": 0.001, "0.01 g": 0.01, "0.1 g": 0.1}
+
+# Page CSS, built once at import instead of re-parsed per rerun.
+_CSS_BLOCK = """
 <style>
 div.stImage { margin-bottom: -2.5rem; }
 h1 { margin-top: 0.15rem; margin-bottom: 0.15rem; line-height: 1.05; }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# Commented out to avoid error if logo is missing
-# st.image(Image.open(LOGO_PATH), width=400)
+
+@st.cache_resource
+def _load_logo(path: str, max_px: int):
+    # Downscale once at load so the cached image matches the display size
+    # instead of shipping the full-resolution bitmap on every rerun.
+    # Pillow is only needed here, so defer its import off the cold-start path.
+    from PIL import Image
+
+    img = Image.open(path)
+    img.thumbnail((max_px, max_px), Image.LANCZOS)
+    return img
+
+
+st.markdown(_CSS_BLOCK, unsafe_allow_html=True)
+
+if LOGO_PATH.exists():
+    st.image(_load_logo(str(LOGO_PATH), 400), width=400)
 st.markdown("<h1>Suppository Base Calculator</h1>", unsafe_allow_html=True)
 st.markdown("🧨 Chat with an AI tutor to compute the required base using the 5-step density-ratio method.")
 
@@ -26,15 +55,8 @@ with st.sidebar.form("calc_form"):
     N = st.number_input("Number of suppositories (N)", min_value=1, value=12, step=1)
 
     st.subheader("Base")
-    base_options = {
-        "Cocoa butter (theobroma oil) ~0.90 g/mL": 0.90,
-        "PEG blend (e.g., 1450/1000) ~1.20 g/mL": 1.20,
-        "Glycerinated gelatin ~1.25 g/mL": 1.25,
-        "Witepsol/HBW type ~0.95 g/mL": 0.95,
-        "Custom…": None,
-    }
-    base_choice = st.selectbox("Select base (prefill density)", list(base_options.keys()), index=0)
-    base_density = base_options[base_choice] if base_options[base_choice] else st.number_input(
+    base_choice = st.selectbox("Select base (prefill density)", _BASE_LABELS, index=0)
+    base_density = _BASE_OPTIONS[base_choice] if _BASE_OPTIONS[base_choice] else st.number_input(
         "ρ(base) (g/mL)", min_value=0.0001, value=1.0, step=0.01, format="%.4f"
     )
     blank_unit_weight_g = st.number_input("Average blank weight per unit (g)", min_value=0.0, value=2.00, step=0.01, format="%.4f")
@@ -50,38 +72,47 @@ with st.sidebar.form("calc_form"):
 
     st.subheader("Active Ingredients (per suppository)")
     max_apis = st.number_input("How many API components?", min_value=1, max_value=6, value=1, step=1)
+    # One editable table instead of 3 widgets per API row.
+    n_rows = int(max_apis)
+    if api_mode == "Density (ρ)":
+        prop_col = "ρ (g/mL)"
+        prop_defaults = [3.00] + [1.00] * (n_rows - 1)
+    else:
+        prop_col = "DF (g API per 1 g base)"
+        prop_defaults = [1.50] + [1.00] * (n_rows - 1)
+    api_table = st.data_editor(
+        pd.DataFrame({
+            "Amount": [200.0] + [0.0] * (n_rows - 1),
+            "Unit": ["mg"] * n_rows,
+            prop_col: prop_defaults,
+        }),
+        num_rows="fixed",
+        column_config={
+            "Amount": st.column_config.NumberColumn(min_value=0.0, format="%.4f", required=True),
+            "Unit": st.column_config.SelectboxColumn(options=["mg", "g"], required=True),
+            prop_col: st.column_config.NumberColumn(min_value=0.0001, format="%.4f", required=True),
+        },
+        key=f"apis_table_{api_mode}_{n_rows}",
+    )
     apis = []
-    for i in range(int(max_apis)):
-        st.markdown(f"**API {i+1}**")
-        cols = st.columns([1, 1, 1])
-        with cols[0]:
-            amt_value = st.number_input(f"Amount ({i+1})", min_value=0.0, value=200.0 if i == 0 else 0.0, step=0.01, format="%.4f", key=f"amt_{i}")
-        with cols[1]:
-            unit = st.selectbox(f"Unit ({i+1})", ["mg", "g"], index=0, key=f"unit_{i}")
-        with cols[2]:
-            if api_mode == "Density (ρ)":
-                rho = st.number_input(f"ρ (g/mL)", min_value=0.0001, value=3.00 if i == 0 else 1.00, step=0.01, format="%.4f", key=f"rho_{i}")
-                df = None
-            else:
-                df = st.number_input(f"DF (g API per 1 g base)", min_value=0.0001, value=1.50 if i == 0 else 1.00, step=0.01, format="%.4f", key=f"df_{i}")
-                rho = None
-        amt_g = amt_value / 1000.0 if unit == "mg" else amt_value
+    for i, row in enumerate(api_table.to_dict("records")):
+        amt_g = row["Amount"] / 1000.0 if row["Unit"] == "mg" else row["Amount"]
+        if api_mode == "Density (ρ)":
+            rho, df = row[prop_col], None
+        else:
+            rho, df = None, row[prop_col]
         apis.append({"name": f"API {i+1}", "amt_g": amt_g, "rho": rho, "df": df})
 
     st.markdown("---")
     st.subheader("Pharmacy Controls")
     overage_pct = st.number_input("Overage for base to cover loss (%)", min_value=0.0, value=0.0, step=0.5)
-    round_step = st.selectbox("Round required base to nearest", ["none", "0.001 g", "0.01 g", "0.1 g"], index=1)
+    round_step = st.selectbox("Round required base to nearest", list(_ROUND_STEPS), index=1)
 
     submitted = st.form_submit_button("Calculate")
 
 def round_to(x, step_label):
-    if step_label == "none":
-        return x
-    step = {"0.001 g": 0.001, "0.01 g": 0.01, "0.1 g": 0.1}[step_label]
-    if step <= 0:
-        return x
-    return round(x / step) * step
+    step = _ROUND_STEPS.get(step_label)
+    return x if step is None or step <= 0 else round(x / step) * step
 
 if submitted:
     total_api_per_unit = sum(a["amt_g"] for a in apis)
@@ -93,7 +124,8 @@ if submitted:
 
     if api_mode == "Density (ρ)":
         for a in apis:
-            if not a["rho"] or a["rho"] <= 0:
+            # Negated '> 0' also traps NaN from a cleared data_editor cell.
+            if not (a["rho"] and a["rho"] > 0):
                 st.error(f"{a['name']}: API density must be > 0.")
                 st.stop()
             ratio = a["rho"] / base_density
@@ -101,7 +133,7 @@ if submitted:
             displaced_per_unit += (a["amt_g"] / ratio)
     else:
         for a in apis:
-            if not a["df"] or a["df"] <= 0:
+            if not (a["df"] and a["df"] > 0):
                 st.error(f"{a['name']}: DF must be > 0.")
                 st.stop()
             displaced_per_unit += (a["amt_g"] / a["df"])